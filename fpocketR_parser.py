@@ -3,22 +3,41 @@
 
 import argparse
 import csv
+import errno
+import functools
 import glob
+import io
+import mmap
+import multiprocessing
 import os
 import shutil
 import subprocess
+import tempfile
+import threading
 import zipfile
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
+FLOAT_FORMAT = '%.3f'
+MMAP_SCAN_MIN_SIZE = 32 << 10  # Smallest PQR file scanned with NumPy instead of line by line
+HETATM_FORMAT = "HETATM%5d  XE  PCK A   1    %8.3f%8.3f%8.3f  1.00 96.24           Xe\n"
+
 def argument_parser():
     """Parses command-line arguments for the script."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter, prog='fpocketR_parser')
-    parser.add_argument("-f", "--file", required=True, dest="file", help="Input pdb file.")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("-f", "--file", dest="file", help="Input pdb file.")
+    inputs.add_argument("-b", "--batch", dest="batch", help="Glob pattern of input pdb files, processed in parallel (quote it to keep the shell from expanding it).")
+    parser.add_argument("-c", "--compress-level", type=int, default=3, choices=range(10), metavar="{0-9}", dest="compress_level",
+                        help="DEFLATE level for the fpocket-R.zip archive (default: 3, favours speed over size).")
+    parser.add_argument("--pyarrow", action="store_true", dest="pyarrow",
+                        help="Read the pocket characteristics CSV with pyarrow instead of pandas (needs pyarrow installed).")
     args = parser.parse_args()
     #return args.file
     #return os.path.abspath(args.file)
-    return os.path.abspath(args.file), os.path.basename(args.file).rsplit('.', 1)[0]
+    return args
 
 def find_conda():
     """Finds the Conda executable path."""
@@ -42,122 +61,336 @@ def find_conda():
             return path
     return None
 
-def run_fpocketR(inpdb):
-    """Runs the fpocketR analysis on the specified pdb file and checks for the absence of pockets."""
+def run_fpocketR(inpdb, work_dir=None):
+    """
+    Runs the fpocketR analysis on the specified pdb file in work_dir (default: cwd) and checks for the absence of pockets.
+
+    Returns:
+        list, bool or None: The (non-empty) list of files fpocketR wrote, relative to work_dir/fpocket-R, on success;
+        False if no pockets were found; None if fpocketR failed or wrote nothing.
+    """
     conda_executable = find_conda()
     if not conda_executable:
         print("Conda executable not found.")
         return None
 
     conda_env = 'fpocketR'
-    fpocket_command = f'{conda_executable} run -n {conda_env} python -m fpocketR -pdb {inpdb} --ligand noll --offset 0 -o fpocket-R'
+    # --no-capture-output makes conda stream fpocketR's output instead of replaying it at exit
+    fpocket_command = [conda_executable, 'run', '--no-capture-output', '-n', conda_env, 'python', '-m', 'fpocketR',
+                       '-pdb', inpdb, '--ligand', 'noll', '--offset', '0', '-o', 'fpocket-R']
 
     try:
-        result = subprocess.run(fpocket_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        #print("fpocketR output:", result.stdout)
-        #print("fpocketR errors:", result.stderr)
-        if "No Pockets Found" in result.stdout or "No Pockets Found" in result.stderr:
+        no_pockets = False
+        with subprocess.Popen(fpocket_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1, cwd=work_dir) as proc:
+            for line in proc.stdout:
+                #print("fpocketR output:", line, end='')
+                if "No Pockets Found" in line:
+                    no_pockets = True
+        # Leaving the with block waits for conda; fpocketR is its child, so it is not terminated early
+        # and cannot outlive the cleanup done by the caller
+        if no_pockets:
             print("No pockets were found by fpocketR.")
             return False  # Indicate that no pockets were found
-        return True  # Indicate that the process was successful and pockets were likely found
-    except subprocess.CalledProcessError as e:
+        # Record what fpocketR produced now, so archiving does not have to walk the tree again
+        output_dir = os.path.join(work_dir or os.getcwd(), "fpocket-R")
+        if not os.path.isdir(output_dir):
+            print(f"fpocketR did not create its output directory: {output_dir}")
+            return None
+        produced_files = [entry.path[len(output_dir) + 1:] for entry in walk_files(output_dir)]
+        if not produced_files:
+            print(f"fpocketR did not write any files to {output_dir}")
+            return None
+        return produced_files  # Pockets were likely found
+    except (OSError, subprocess.SubprocessError) as e:
         print("An error occurred while running fpocketR:", e)
         return None  # Indicate failure possibly due to execution error
 
-def get_best_pockets(target_dir):
-    """Identifies the best pockets from fpocketR analysis based on various metrics."""
+def get_best_pockets(target_dir, use_pyarrow=False):
+    """Identifies the best pockets from fpocketR analysis based on various metrics, optionally reading the CSV with pyarrow."""
     if not os.path.isdir(target_dir):
         print(f"Directory does not exist: {target_dir}")
         return
 
-    os.chdir(target_dir)
-    csv_files = glob.glob('*characteristics.csv')
-    if not csv_files:
+    # Only the first match is used, so stop scanning the directory as soon as one is found
+    csv_file = None
+    with os.scandir(target_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('characteristics.csv') and not entry.name.startswith('.'):
+                csv_file = entry.path
+                break
+    if csv_file is None:
         print("No characteristics CSV file found.")
         return
 
-    csv_file = csv_files[0]
-    df = pd.read_csv(csv_file)
-    relevant_data = df[['Pocket', 'Score', 'Drug score', 'SASA', 'Volume']]
+    # Only these columns are parsed; the rest of the characteristics table is skipped by the reader
+    columns = {'Pocket': 'int64', 'Score': 'float64', 'Drug score': 'float64', 'SASA': 'float64', 'Volume': 'float64'}
+    pacsv = None
+    if use_pyarrow:
+        # Opt-in only: importing pyarrow costs more than pandas needs to read a few dozen rows
+        try:
+            import pyarrow.csv as pacsv
+        except ImportError:
+            print("pyarrow is not installed, reading the characteristics CSV with pandas.")
+    if pacsv is not None:
+        convert_options = pacsv.ConvertOptions(include_columns=list(columns), column_types=columns)
+        relevant_data = pacsv.read_csv(csv_file, convert_options=convert_options).to_pandas()
+    else:
+        relevant_data = pd.read_csv(csv_file, usecols=list(columns), dtype=columns, engine='c')
     
-    pockets = {
-        'score': relevant_data.loc[relevant_data['Score'].idxmax()]['Pocket'],
-        'drug_score': relevant_data.loc[relevant_data['Drug score'].idxmax()]['Pocket'],
-        'sasa': relevant_data.loc[relevant_data['SASA'].idxmax()]['Pocket'],
-        'volume': relevant_data.loc[relevant_data['Volume'].idxmax()]['Pocket']
-    }
+    metrics = {'score': 'Score', 'drug_score': 'Drug score', 'sasa': 'SASA', 'volume': 'Volume'}
+    # One idxmax over all metric columns, then a single gather of the matching pocket numbers
+    best_rows = relevant_data[list(metrics.values())].idxmax().to_numpy()
+    pockets = dict(zip(metrics, relevant_data['Pocket'].to_numpy()[best_rows].astype(int)))
     
-    os.chdir("./pockets")
-    results = {}
+    pockets_dir = os.path.join(target_dir, 'pockets')
+    # Metrics often agree on the best pocket, so each distinct pocket file is parsed only once
+    metrics_by_pocket = {}
     for metric, pocket in pockets.items():
-        pocket_file = f"pocket{int(pocket)}_vert.pqr"
-        if os.path.exists(pocket_file):
-            df_pocket = parse_pqr(pocket_file)
-            median_df = format_dataframe(df_pocket.median().to_frame().T)
-            mean_df = format_dataframe(df_pocket.mean().to_frame().T)
-            results[metric] = {'median': median_df, 'mean': mean_df}
-            median_df.to_csv(f"{metric}_median.csv", index=False)
-            mean_df.to_csv(f"{metric}_mean.csv", index=False)
-    return results
-
-def format_dataframe(df):
-    """Formats the DataFrame by setting floating-point precision and ensuring integer pocket numbers."""
-    df['pocket_number'] = df['pocket_number'].astype(int)
-    for column in df.select_dtypes(include=['float64']).columns:
-        df[column] = df[column].apply(lambda x: f"{x:.3f}")
-    return df
+        metrics_by_pocket.setdefault(pocket, []).append(metric)
+    # Distinct pockets read their own files and write their own CSVs, so they can run side by side
+    with ThreadPoolExecutor(max_workers=len(metrics_by_pocket)) as executor:
+        futures = {pocket: executor.submit(summarize_pocket, pockets_dir, pocket, pocket_metrics)
+                   for pocket, pocket_metrics in metrics_by_pocket.items()}
+        summaries = {pocket: future.result() for pocket, future in futures.items()}
+    return {metric: summaries[pocket] for metric, pocket in pockets.items() if summaries[pocket] is not None}
+
+def summarize_pocket(pockets_dir, pocket, metrics):
+    """Writes the median and mean vertex coordinates of a pocket to CSV files in pockets_dir named after each metric."""
+    pocket_file = os.path.join(pockets_dir, f"pocket{int(pocket)}_vert.pqr")
+    if not os.path.exists(pocket_file):
+        return None
+    pocket_number, xyz = parse_pqr(pocket_file)
+    if pocket_number is None:
+        return None
+    median_df = format_dataframe(pocket_number, np.median(xyz, axis=0))
+    mean_df = format_dataframe(pocket_number, xyz.mean(axis=0))
+    for metric in metrics:
+        median_df.to_csv(os.path.join(pockets_dir, f"{metric}_median.csv"), index=False, float_format=FLOAT_FORMAT)
+        mean_df.to_csv(os.path.join(pockets_dir, f"{metric}_mean.csv"), index=False, float_format=FLOAT_FORMAT)
+    return {'median': median_df, 'mean': mean_df}
+
+def format_dataframe(pocket_number, coordinates):
+    """Builds the one-row DataFrame of an integer pocket number and its x, y, z; floats are written with FLOAT_FORMAT by to_csv."""
+    return pd.DataFrame([[int(pocket_number), *coordinates]], columns=['pocket_number', 'x', 'y', 'z'])
+
+def read_atom_records(file_path):
+    """Collects the ATOM records of a PQR file into one buffer, scanning large files through a memory map with NumPy."""
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < MMAP_SCAN_MIN_SIZE:
+            # Typical pocket files are a few KB, where NumPy's fixed setup cost outweighs the per-line loop
+            return b''.join(line for line in file if line.startswith(b'ATOM'))
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            starts = np.concatenate(([0], np.flatnonzero(data[:-1] == 10) + 1))  # '\n'
+            lengths = np.diff(starts, append=len(data))
+            # Test the first four bytes of every line at once instead of slicing lines out one by one
+            keep = np.zeros(len(starts), dtype=bool)
+            full = starts + 4 <= len(data)
+            head = starts[full]
+            keep[full] = (data[head] == 65) & (data[head + 1] == 84) & (data[head + 2] == 79) & (data[head + 3] == 77)  # 'ATOM'
+            records = data[np.repeat(keep, lengths)].tobytes()
+            del data  # Release the export so the map can be closed
+    return records
+
+def parse_number(buf, start, end):
+    """Converts the ASCII number in buf[start:end] to a float without going through Python objects."""
+    i = start
+    sign = 1.0
+    if buf[i] == 45 or buf[i] == 43:  # '-' or '+'
+        if buf[i] == 45:
+            sign = -1.0
+        i += 1
+    mantissa = 0
+    scale = 0
+    while i < end and 48 <= buf[i] <= 57:
+        mantissa = mantissa * 10 + buf[i] - 48
+        i += 1
+    if i < end and buf[i] == 46:  # '.'
+        i += 1
+        while i < end and 48 <= buf[i] <= 57:
+            mantissa = mantissa * 10 + buf[i] - 48
+            scale += 1
+            i += 1
+    if i < end and (buf[i] == 101 or buf[i] == 69):  # 'e' or 'E'
+        i += 1
+        exp_sign = 1
+        if i < end and (buf[i] == 45 or buf[i] == 43):
+            if buf[i] == 45:
+                exp_sign = -1
+            i += 1
+        exponent = 0
+        while i < end and 48 <= buf[i] <= 57:
+            exponent = exponent * 10 + buf[i] - 48
+            i += 1
+        scale -= exp_sign * exponent
+    value = float(mantissa)
+    if scale > 0:
+        value /= 10.0 ** scale
+    elif scale < 0:
+        value *= 10.0 ** -scale
+    return sign * value
+
+def parse_atom_fields(buf, pocket, xyz):
+    """Fills pocket and the rows of xyz from the 5th-8th whitespace-delimited fields of each record in buf."""
+    size = buf.shape[0]
+    n = 0
+    i = 0
+    while i < size:
+        field = 0
+        while i < size and buf[i] != 10:  # '\n'
+            if buf[i] <= 32:
+                i += 1
+                continue
+            start = i
+            while i < size and buf[i] > 32:
+                i += 1
+            if field == 4:
+                pocket[n] = int(parse_number(buf, start, i))
+            elif 5 <= field <= 7:
+                xyz[n, field - 5] = parse_number(buf, start, i)
+            field += 1
+        if field >= 8:
+            n += 1
+        i += 1
+    return n
+
+numba_lock = threading.Lock()
+compiled_parse_atom_fields = None  # False once Numba turned out to be unavailable
+
+def load_numba_kernel():
+    """Imports Numba and compiles parse_atom_fields on first use; returns None if Numba is not installed."""
+    global parse_number, compiled_parse_atom_fields
+    with numba_lock:  # parse_pqr runs on several threads
+        if compiled_parse_atom_fields is None:
+            try:
+                from numba import njit
+            except ImportError:
+                compiled_parse_atom_fields = False
+            else:
+                # The kernel resolves parse_number as a global when it compiles, so swap in the compiled version
+                parse_number = njit(cache=True)(parse_number)
+                compiled_parse_atom_fields = njit(cache=True, nogil=True)(parse_atom_fields)
+        return compiled_parse_atom_fields or None
+
+def parse_fixed_width(buf):
+    """
+    Slices pocket numbers and coordinates out of ATOM records laid out in PDB columns.
+
+    Args:
+        buf (bytes): ATOM records, as returned by read_atom_records.
+
+    Returns:
+        tuple or None: Pocket numbers (resSeq, columns 23-26) and an (n, 3) array of x, y, z (columns 31-54),
+        or None if the records do not all share one line width.
+    """
+    width = buf.find(b'\n') + 1
+    if width < 55 or len(buf) % width:
+        return None
+    rows = np.frombuffer(buf, dtype=np.uint8).reshape(-1, width)
+    if not (rows[:, -1] == 10).all():  # '\n'
+        return None
+    try:
+        pocket = rows[:, 22:26].copy().view('S4').ravel().astype(np.int64)
+        xyz = np.column_stack([rows[:, start:start + 8].copy().view('S8').ravel().astype(np.float64) for start in (30, 38, 46)])
+    except ValueError:
+        return None
+    return pocket, xyz
 
 def parse_pqr(file_path):
-    """Parses PQR files to extract pocket numbers and coordinates."""
-    data = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            if line.startswith('ATOM'):
-                parts = line.split()
-                x, y, z = float(parts[5]), float(parts[6]), float(parts[7])
-                pocket_number = int(parts[4])
-                data.append([pocket_number, x, y, z])
-    return pd.DataFrame(data, columns=['pocket_number', 'x', 'y', 'z'])
+    """
+    Parses a pocket PQR file into its pocket number and vertex coordinates.
+
+    Args:
+        file_path (str): Path to a pocketN_vert.pqr file.
 
+    Returns:
+        tuple: The pocket number (None if the file has no ATOM records) and an (n, 3) float64 array of x, y, z.
+    """
+    buf = read_atom_records(file_path)
+    if not buf:
+        return None, np.empty((0, 3))
+    # fpocket writes fixed-width records, which column slicing handles fastest at pocket sizes;
+    # the tokenizing parsers only deal with irregular layouts
+    fields = parse_fixed_width(buf)
+    kernel = load_numba_kernel() if fields is None else None
+    if fields is not None:
+        pocket, xyz = fields
+    elif kernel is not None:
+        # Every line in buf is an ATOM record, so the line count bounds the number of rows
+        count = buf.count(b'\n') + (not buf.endswith(b'\n'))
+        pocket = np.empty(count, dtype=np.int64)
+        xyz = np.empty((count, 3))
+        n = kernel(np.frombuffer(buf, dtype=np.uint8), pocket, xyz)
+        pocket, xyz = pocket[:n], xyz[:n]
+    else:
+        # Let the C parser tokenize the ATOM records instead of splitting them in Python
+        df = pd.read_csv(io.BytesIO(buf), sep=r'\s+', header=None, usecols=[4, 5, 6, 7],
+                         dtype={4: 'int64', 5: 'float64', 6: 'float64', 7: 'float64'}, engine='c')
+        pocket, xyz = df[4].to_numpy(), df[[5, 6, 7]].to_numpy()
+    # All vertices of a pocketN_vert.pqr file belong to pocket N
+    return (int(pocket[0]) if len(pocket) else None), xyz
 
 
-def move_and_compress_files(base_dir, final_output_dir, name, main_dir):
-    """Moves CSV files from pockets to the centralized output directory and compresses the fpocket-R directory."""
+
+def walk_files(path):
+    """Recursively yields os.DirEntry objects for the files under path, reusing the stat data cached by os.scandir."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file():
+                yield entry
+
+def move_file(src, dest):
+    """Moves src to dest, replacing dest, with a single rename; copies only when they live on different filesystems."""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dest)
+
+def move_and_compress_files(base_dir, final_output_dir, name, main_dir, compress_level=3, produced_files=None):
+    """
+    Moves CSV files from pockets to the centralized output directory and compresses the fpocket-R directory.
+
+    produced_files is the manifest returned by run_fpocketR; without it the fpocket-R tree is walked.
+    """
     
     # Locate pockets directory inside the fpocket-R output
     
-    source_dir_pattern = os.path.join(main_dir, "fpocket-R", f'{name}_clean_out', 'pockets')
-    source_dirs = glob.glob(source_dir_pattern)
+    source_dir = os.path.join(main_dir, "fpocket-R", f'{name}_clean_out', 'pockets')
      
-    if not source_dirs:
-        print(f"No directories found matching pattern: {source_dir_pattern}")
+    if not os.path.isdir(source_dir):
+        print(f"Directory does not exist: {source_dir}")
         return
     
-    source_dir = source_dirs[0]
-    
     # Move all CSV files from the pockets directory to the centralized output directory
-    csv_files = glob.glob(os.path.join(source_dir, '*.csv'))
+    with os.scandir(source_dir) as entries:
+        csv_files = [entry.path for entry in entries if entry.name.endswith('.csv') and entry.is_file()]
     for file in csv_files:
         dest_file = os.path.join(final_output_dir, os.path.basename(file))
-        if os.path.exists(dest_file):
-            os.remove(dest_file)  # Remove the file if it exists to allow overwriting
-            print(f"Removed existing file at {dest_file}")
-        shutil.move(file, dest_file)
+        move_file(file, dest_file)  # Overwrites an existing file of the same name
         #print(f"Moved {file} to {final_output_dir}")
   
     # Compress the entire fpocket-R directory and move it to the centralized output directory
     zip_file_dir = os.path.join(main_dir, "fpocket-R")
     zip_file = os.path.join(main_dir, "fpocket-R.zip")
     
-    with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(zip_file_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, zip_file_dir)  # Keep the relative structure within the zip
-                zipf.write(file_path, arcname)
+    if produced_files is None:
+        produced_files = [entry.path[len(zip_file_dir) + 1:] for entry in walk_files(zip_file_dir)]
+    moved_files = set(csv_files)
+    
+    with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=compress_level) as zipf:
+        for arcname in produced_files:  # Paths relative to fpocket-R keep the structure within the zip
+            file_path = os.path.join(zip_file_dir, arcname)
+            if file_path in moved_files:
+                continue
+            zipf.write(file_path, arcname)  # Streams the file in chunks, no full read into memory
     print(f"Compressed fpocket-R to {zip_file}")
 
-    shutil.move(zip_file, final_output_dir)
+    move_file(zip_file, os.path.join(final_output_dir, os.path.basename(zip_file)))
     # Clean up by removing the fpocket-R directory
     shutil.rmtree(zip_file_dir)
     clean_pdb = main_dir+f"/{name}_clean.pdb"
@@ -182,32 +415,92 @@ def csv_to_pdb(input_dir):
         base_name = os.path.basename(csv_file).rsplit('.', 1)[0]  # Extract base name
         pdb_file = os.path.join(input_dir, f"{base_name}.pdb")    # Define output PDB file path
 
-        # Open the CSV and PDB files
-        with open(csv_file, 'r') as infile, open(pdb_file, 'w') as outfile:
-            # Skip the header line in the CSV
-            next(infile)
-
-            # Iterate over each line in the CSV
-            for line in infile:
-                pocket_number, x, y, z = line.strip().split(',')  # Extract fields
-                # Write the PDB format line
-                outfile.write(f"HETATM{int(pocket_number):5d}  XE  PCK A   1    {float(x):8.3f}{float(y):8.3f}{float(z):8.3f}  1.00 96.24           Xe\n")
+        # Parse the whole CSV at once, skipping the header line
+        rows = np.loadtxt(csv_file, delimiter=',', skiprows=1, ndmin=2)
 
-            # Add the PDB file termination lines
-            outfile.write("TER\nEND\n")
+        # Format every PDB line and write the file, termination lines included, in one call
+        with open(pdb_file, 'w') as outfile:
+            outfile.write(''.join(HETATM_FORMAT % (int(pocket_number), x, y, z) for pocket_number, x, y, z in rows) + "TER\nEND\n")
 
         print(f"Converted {csv_file} to {pdb_file}")
 
+def process_pdb(infile, output_dir, compress_level=3, work_dir=None, use_pyarrow=False):
+    """
+    Runs fpocketR on one pdb file and collects the best-pocket files and the fpocket-R archive in output_dir.
+
+    Args:
+        infile (str): Absolute path of the input pdb file.
+        output_dir (str): Directory receiving the CSV/PDB files and fpocket-R.zip.
+        compress_level (int): DEFLATE level for the archive.
+        work_dir (str): Directory fpocketR runs in (default: cwd).
+        use_pyarrow (bool): Read the characteristics CSV with pyarrow.
+
+    Returns:
+        bool or None: True on success, False if no pockets were found, None if fpocketR failed.
+    """
+    work_dir = work_dir or os.getcwd()
+    name = os.path.basename(infile).rsplit('.', 1)[0]
+    fpocketr_dir = infile.split(name)[0]
+
+    produced_files = run_fpocketR(infile, work_dir)
+    if produced_files is None or produced_files is False:
+        shutil.rmtree(os.path.join(work_dir, "fpocket-R"), ignore_errors=True)
+        return produced_files
+
+    char_dir = os.path.join(work_dir, "fpocket-R", f"{name}_clean_out")
+    get_best_pockets(char_dir, use_pyarrow)
+    move_and_compress_files(fpocketr_dir, output_dir, name, work_dir, compress_level, produced_files)
+    csv_to_pdb(output_dir)
+    return True
+
+def process_batch_pdb(infile, output_dir, compress_level=3, use_pyarrow=False):
+    """Processes one pdb file of a batch in its own scratch directory, writing to output_dir/<name>."""
+    name = os.path.basename(infile).rsplit('.', 1)[0]
+    pdb_output_dir = os.path.join(output_dir, name)
+    os.makedirs(pdb_output_dir, exist_ok=True)
+    # Concurrent fpocketR runs would otherwise share ./fpocket-R and ./<name>_clean.pdb
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"fpocketR_{name}_") as work_dir:
+            return infile, process_pdb(infile, pdb_output_dir, compress_level, work_dir, use_pyarrow)
+    except Exception as e:
+        # One bad pdb must not take down the rest of the batch
+        print(f"An error occurred while processing {infile}: {e!r}")
+        return infile, None
+
 if __name__ == '__main__':
     main_dir = os.getcwd()
-    os.system("rm -r fpocket-R")
+    shutil.rmtree(os.path.join(main_dir, "fpocket-R"), ignore_errors=True)
     output_dir = os.path.join(main_dir, "fpocketr")
     os.makedirs(output_dir, exist_ok=True)
 
-    infile, name = argument_parser()
+    args = argument_parser()
+    if args.batch:
+        infiles = sorted(os.path.abspath(path) for path in glob.glob(args.batch))
+        if not infiles:
+            print(f"No pdb files found matching pattern: {args.batch}")
+            exit(2)
+        # Results go to fpocketr/<name>, so inputs sharing a base name would overwrite each other
+        names = {}
+        for path in infiles:
+            names.setdefault(os.path.basename(path).rsplit('.', 1)[0], []).append(path)
+        duplicates = {name: paths for name, paths in names.items() if len(paths) > 1}
+        if duplicates:
+            for name, paths in duplicates.items():
+                print(f"Input files share the base name '{name}': {', '.join(paths)}")
+            exit(2)
+        worker = functools.partial(process_batch_pdb, output_dir=output_dir, compress_level=args.compress_level,
+                                   use_pyarrow=args.pyarrow)
+        # Each pdb pays for its own fpocketR run, so spread them over half of the cores
+        with multiprocessing.Pool(max(1, (os.cpu_count() or 2) // 2)) as pool:
+            batch_results = pool.map(worker, infiles)
+        failed = [infile for infile, result in batch_results if not result]
+        for infile in failed:
+            print(f"Processing terminated for {infile}: No pockets found or fpocketR failed to execute properly.")
+        exit(2 if failed else 0)
+
+    infile = os.path.abspath(args.file)
+    compress_level = args.compress_level
     #name = ''.join(infile.split(".")[:-1])
-   
-    fpocketr_dir = infile.split(name)[0]
 
     '''
     if run_fpocketR(infile):
@@ -220,28 +513,15 @@ if __name__ == '__main__':
         move_and_compress_files(base_directory)
     else:
         print("Processing terminated: No pockets found or fpocketR failed to execute properly.")
-        os.system("rm -r fpocket-R")
+        shutil.rmtree("fpocket-R", ignore_errors=True)
         exit(2)
-    os.system("rm -r fpocket-R")
+    shutil.rmtree("fpocket-R", ignore_errors=True)
     '''
 
-    result = run_fpocketR(infile)
+    result = process_pdb(infile, output_dir, compress_level, main_dir, args.pyarrow)
     if result is None:
         print("Processing terminated: fpocketR failed to execute properly.")
-        #os.system("rm -r fpocket-R")
-        shutil.rmtree("fpocket-R", ignore_errors=True)
         exit(2)
     elif result is False:
         print("Processing terminated: No pockets found.")
-        #os.system("rm -r fpocket-R")
-        shutil.rmtree("fpocket-R", ignore_errors=True)
         exit(2)
-
-
-    #char_dir = os.path.join(output_dir, f"{name}_clean_out")
-    char_dir = os.path.join("fpocket-R", f"{name}_clean_out")
-    #char_dir = f"fpocket-R/{name}_clean_out"
-    best_pockets_results = get_best_pockets(char_dir)
-    #print(best_pockets_results)
-    move_and_compress_files(fpocketr_dir, output_dir, name, main_dir)
-    csv_to_pdb(output_dir)